@@ -1,100 +1,670 @@
-import json
-from typing import List, Dict, Any, Set, Tuple
-from datetime import datetime, timedelta
+import functools
+import operator
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, FrozenSet, Iterator, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 
 import azure.functions as func
+import numba
+import numpy as np
+import orjson
+
+# Budget of the quantity search before it settles for the best combo found so far: search steps
+# (line include / exclude decisions and alternating-path searches) and wall-clock seconds
+MAX_SEARCH_STEPS = 50_000
+MAX_SEARCH_SECONDS = 0.5
 
 
 # ---------- Employee -> Line: all maximum-cardinality assignments ----------
-def employee_assignment(lines_available: List[str], employees_available: List[Dict[str, Any]]) -> List[List[Dict[str, str]]]:
+def _intern_graph(lines_available: List[str],
+                  employees_available: List[Dict[str, Any]]) -> Tuple[List[str], List[str], Tuple[Tuple[int, ...], ...]]:
+    """
+    Returns (line_names, emp_names, frozen_adj): line / employee IDs interned to small ints and the
+    qualification graph as a hashable adjacency tuple (line idx -> ascending employee idxs).
+    """
     # Build graph: line -> list of qualified employee IDs (preserve given order)
     line_to_emps = {
         line: [emp["id"] for emp in employees_available if line in emp.get("qualifiedLines", [])]
         for line in lines_available
     }
 
-    # 1) Compute one maximum matching size using Kuhn's algorithm
-    match_emp_to_line: Dict[str, str] = {}
+    # Intern line / employee IDs to small ints (sorted, so int order == string order)
+    line_names = sorted(line_to_emps)
+    # IDs are expected unique; dedup (adjacent after sorting) only if they are not
+    emp_names = sorted(emp["id"] for emp in employees_available)
+    if any(a == b for a, b in zip(emp_names, emp_names[1:])):
+        emp_names = sorted(set(emp_names))
+    emp_id = {emp: idx for idx, emp in enumerate(emp_names)}
+    frozen_adj = tuple(tuple(sorted({emp_id[emp] for emp in line_to_emps[line]})) for line in line_names)
+    return line_names, emp_names, frozen_adj
 
-    def try_augment(line: str, seen: Set[str]) -> bool:
-        for emp in line_to_emps.get(line, []):
-            if emp in seen:
-                continue
-            seen.add(emp)
-            if emp not in match_emp_to_line or try_augment(match_emp_to_line[emp], seen):
-                match_emp_to_line[emp] = line
-                return True
+
+def _hopcroft_karp(adj: Tuple[Tuple[int, ...], ...], num_emps: int,
+                   pair_emp: Optional[List[int]] = None) -> List[int]:
+    """
+    Maximum matching via Hopcroft-Karp (BFS layering + layered DFS), returned as the matched
+    line per employee (-1 if unmatched). A partial matching passed as pair_emp is extended in place.
+    """
+    num_lines = len(adj)
+    if pair_emp is None:
+        pair_emp = [-1] * num_emps
+    pair_line = [-1] * num_lines
+    for emp, line in enumerate(pair_emp):
+        if line >= 0:
+            pair_line[line] = emp
+    dist_line = [-1] * num_lines
+    next_edge = [0] * num_lines  # per-phase edge cursor of the layered DFS
+
+    def bfs() -> bool:
+        # Layer lines by alternating-path distance from the unmatched lines
+        queue = deque()
+        for line in range(num_lines):
+            next_edge[line] = 0
+            if pair_line[line] >= 0:
+                dist_line[line] = -1
+            else:
+                dist_line[line] = 0
+                queue.append(line)
+        found_free_emp = False
+        while queue:
+            line = queue.popleft()
+            for emp in adj[line]:
+                nxt = pair_emp[emp]
+                if nxt < 0:
+                    found_free_emp = True
+                elif dist_line[nxt] < 0:
+                    dist_line[nxt] = dist_line[line] + 1
+                    queue.append(nxt)
+        return found_free_emp
+
+    def dfs(root: int) -> bool:
+        # Iterative layered DFS: only follow edges into the next BFS layer. The stack is the
+        # alternating path; each line on it points (next_edge) at the employee it would take.
+        stack = [root]
+        while stack:
+            line = stack[-1]
+            edges = adj[line]
+            while next_edge[line] < len(edges):
+                nxt = pair_emp[edges[next_edge[line]]]
+                if nxt < 0:
+                    # Free employee reached: flip the whole path
+                    for ln in stack:
+                        emp = adj[ln][next_edge[ln]]
+                        pair_line[ln] = emp
+                        pair_emp[emp] = ln
+                    return True
+                if dist_line[nxt] == dist_line[line] + 1:
+                    stack.append(nxt)
+                    break
+                next_edge[line] += 1
+            else:
+                # Dead end: drop the line from this phase and advance its parent
+                dist_line[line] = -1
+                stack.pop()
+                if stack:
+                    next_edge[stack[-1]] += 1
         return False
 
-    for line in lines_available:
-        try_augment(line, set())
-    max_size = len(match_emp_to_line)
+    while bfs():
+        for line in range(num_lines):
+            if pair_line[line] < 0:
+                dfs(line)
+    return pair_emp
+
+
+@functools.lru_cache(maxsize=128)
+def _max_matching_graph(frozen_adj: Tuple[Tuple[int, ...], ...],
+                        num_emps: int) -> Tuple[Tuple[Tuple[int, ...], ...], int]:
+    """
+    Returns (adj, max_size): the qualification graph restricted to edges that appear in some
+    maximum matching, and the maximum matching size. Cached per qualification graph.
+    """
+    adj = frozen_adj
+    num_lines = len(adj)
+
+    # 1) Compute one maximum matching
+    match_emp_to_line = _hopcroft_karp(adj, num_emps)
+    max_size = num_emps - match_emp_to_line.count(-1)
     if max_size == 0:
-        return []
+        return adj, 0
+
+    # Keep only edges that lie in some maximum matching (Dulmage-Mendelsohn), via the
+    # residual graph of the matching: unmatched edges line -> emp, matched edges emp -> line.
+    # Nodes 0..num_lines-1 are lines, num_lines + e is employee e.
+    residual: List[List[int]] = [[] for _ in range(num_lines + num_emps)]
+    reverse: List[List[int]] = [[] for _ in range(num_lines + num_emps)]
+    for line in range(num_lines):
+        for emp in adj[line]:
+            if match_emp_to_line[emp] == line:
+                src, dst = num_lines + emp, line
+            else:
+                src, dst = line, num_lines + emp
+            residual[src].append(dst)
+            reverse[dst].append(src)
+
+    def tarjan_scc(graph: List[List[int]]) -> List[int]:
+        # Iterative Tarjan; returns component id per node
+        n = len(graph)
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        comp = [-1] * n
+        stack: List[int] = []
+        counter = 0
+        num_comps = 0
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, iter(graph[root]))]
+            while work:
+                v, it = work[-1]
+                for w in it:
+                    if index[w] < 0:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append((w, iter(graph[w])))
+                        break
+                    if on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        if low[v] < low[parent]:
+                            low[parent] = low[v]
+                    if low[v] == index[v]:
+                        while True:
+                            w = stack.pop()
+                            on_stack[w] = 0
+                            comp[w] = num_comps
+                            if w == v:
+                                break
+                        num_comps += 1
+        return comp
+
+    def reachable(graph: List[List[int]], starts: List[int]) -> bytearray:
+        seen = bytearray(len(graph))
+        queue = deque(starts)
+        for v in starts:
+            seen[v] = 1
+        while queue:
+            v = queue.popleft()
+            for w in graph[v]:
+                if not seen[w]:
+                    seen[w] = 1
+                    queue.append(w)
+        return seen
+
+    comp = tarjan_scc(residual)
+    matched_lines = set(match_emp_to_line)
+    # Even alternating paths starting at a free line / ending at a free employee
+    from_free_line = reachable(residual, [ln for ln in range(num_lines) if ln not in matched_lines])
+    to_free_emp = reachable(reverse, [num_lines + e for e in range(num_emps) if match_emp_to_line[e] < 0])
+    adj = tuple(
+        tuple(
+            emp for emp in adj[line]
+            if match_emp_to_line[emp] == line
+            or comp[line] == comp[num_lines + emp]
+            or from_free_line[line]
+            or to_free_emp[num_lines + emp]
+        )
+        for line in range(num_lines)
+    )
+    return adj, max_size
 
-    # 2) Enumerate all matchings of size == max_size (backtracking + pruning)
-    ordered_lines = sorted(lines_available, key=lambda ln: len(line_to_emps.get(ln, [])))
-    results_set: Set[Tuple[Tuple[str, str], ...]] = set()
-    used_emps: Set[str] = set()
-    cur_pairs: List[Tuple[str, str]] = []
 
-    total_emps = len({emp["id"] for emp in employees_available})
+# Results of the enter() callback of _backtrack
+_REJECT, _PRUNE, _DESCEND, _LEAF, _STOP = range(5)
 
-    def backtrack(i: int):
-        remaining_lines = len(ordered_lines) - i
-        remaining_emps = total_emps - len(used_emps)
-        if len(cur_pairs) + min(remaining_lines, remaining_emps) < max_size:
-            return
 
-        if i == len(ordered_lines):
-            if len(cur_pairs) == max_size:
-                results_set.add(tuple(sorted(cur_pairs)))
+def _backtrack(choices: Callable[[int], List[int]],
+               enter: Callable[[int, int], int],
+               leave: Callable[[int, int], None]) -> Iterator[None]:
+    """
+    Explicit-stack DFS shared by the assignment searches. Level i offers the options choices(i),
+    evaluated against the state at the time the level is entered. enter(i, c) tries option c and
+    returns _REJECT (not applied), _PRUNE (applied, don't descend), _DESCEND (go to level i + 1),
+    _LEAF (yield once) or _STOP (not applied, end the search). Applied options are undone by
+    leave(i, c) before the next option at level i.
+    """
+    stack = [[0, iter(choices(0)), None]]
+    while stack:
+        frame = stack[-1]
+        i, options, applied = frame
+        if applied is not None:
+            leave(i, applied)
+            frame[2] = None
+        choice = next(options, None)
+        if choice is None:
+            stack.pop()
+            continue
+        step = enter(i, choice)
+        if step == _REJECT:
+            continue
+        if step == _STOP:
             return
+        frame[2] = choice
+        if step == _DESCEND:
+            stack.append([i + 1, iter(choices(i + 1)), None])
+        elif step == _LEAF:
+            yield
+
+
+def _iter_max_pairs(adj: Tuple[Tuple[int, ...], ...], max_size: int, total_emps: int) -> Iterator[Tuple[Tuple[int, int], ...]]:
+    # 2) Enumerate all matchings of size == max_size (backtracking + pruning).
+    # Every combo is reached by exactly one path (one decision per line, adj rows hold distinct
+    # employees), so combos are yielded once each and callers need no dedup set.
+    if max_size == 0:
+        return
+    ordered_lines = sorted(range(len(adj)), key=lambda ln: len(adj[ln]))
+    num_ordered = len(ordered_lines)
+    used_mask = 0  # bit e set <=> employee e is used
+    remaining_emps = total_emps  # employees not yet used
+    cur_pairs: List[Tuple[int, int]] = []
+
+    def choices(i: int) -> List[int]:
+        # Skip the line (-1), or assign one of its free qualified employees
+        return [-1] + [emp for emp in adj[ordered_lines[i]] if not used_mask >> emp & 1]
+
+    def enter(i: int, emp: int) -> int:
+        nonlocal used_mask, remaining_emps
+        if emp >= 0:
+            used_mask |= 1 << emp
+            remaining_emps -= 1
+            cur_pairs.append((ordered_lines[i], emp))
+        i += 1
+        if len(cur_pairs) + min(num_ordered - i, remaining_emps) < max_size:
+            return _PRUNE
+        if i == num_ordered:
+            return _LEAF if len(cur_pairs) == max_size else _PRUNE
+        return _DESCEND
+
+    def leave(i: int, emp: int) -> None:
+        nonlocal used_mask, remaining_emps
+        if emp >= 0:
+            cur_pairs.pop()
+            used_mask &= ~(1 << emp)
+            remaining_emps += 1
+
+    for _ in _backtrack(choices, enter, leave):
+        yield tuple(sorted(cur_pairs))
+
+
+def iter_max_assignments(lines_available: List[str],
+                         employees_available: List[Dict[str, Any]]) -> Iterator[Tuple[Tuple[str, str], ...]]:
+    """
+    Yields every maximum-cardinality assignment once, as a sorted tuple of (line, employee) pairs.
+    Nothing is materialized, so callers can keep a running best instead of a list of all matchings.
+    """
+    line_names, emp_names, frozen_adj = _intern_graph(lines_available, employees_available)
+    adj, max_size = _max_matching_graph(frozen_adj, len(emp_names))
+    for pairs in _iter_max_pairs(adj, max_size, len(emp_names)):
+        # Interned ids are sorted, so mapped pairs stay sorted
+        yield tuple((line_names[line], emp_names[emp]) for (line, emp) in pairs)
+
 
+def _alternate(adj: Tuple[Tuple[int, ...], ...], pair_line: List[int], pair_emp: List[int],
+               starts: List[int], movable: int, droppable: int) -> bool:
+    """
+    Gives one of the unmatched lines in starts an employee along an alternating path, in place. The
+    path may re-route lines in the movable bitmask and ends at a free employee or takes the
+    employee of a line in the droppable bitmask (which is left unmatched). Returns False,
+    unchanged, if there is none.
+    """
+    seen = bytearray(len(pair_emp))
+    next_edge = [0] * len(adj)  # edge cursor of the DFS, as in _hopcroft_karp
+
+    def direct(line: int) -> int:
+        # A free or droppable employee the line can take without re-routing anyone, or -1
+        for emp in adj[line]:
+            owner = pair_emp[emp]
+            if not seen[emp] and (owner < 0 or droppable >> owner & 1):
+                return emp
+        return -1
+
+    # Iterative DFS: the stack is the alternating path; each line on it points (next_edge) at the
+    # employee it would take, whose current owner is the next line on the stack. Employees seen
+    # from an earlier start lead nowhere, so seen is shared between starts.
+    for start in starts:
+        stack = [start]
+        found = direct(start)
+        while found < 0 and stack:
+            line = stack[-1]
+            edges = adj[line]
+            while next_edge[line] < len(edges):
+                emp = edges[next_edge[line]]
+                if not seen[emp]:
+                    seen[emp] = 1
+                    owner = pair_emp[emp]
+                    if owner >= 0 and movable >> owner & 1:
+                        stack.append(owner)
+                        found = direct(owner)
+                        break
+                next_edge[line] += 1
+            else:
+                # Dead end: advance the parent
+                stack.pop()
+                if stack:
+                    next_edge[stack[-1]] += 1
+        if found >= 0:
+            break
+    else:
+        return False
+
+    # Flip the path; the line at its end takes the found employee
+    owner = pair_emp[found]
+    if owner >= 0:
+        pair_line[owner] = -1
+    for line in stack[:-1]:
+        emp = adj[line][next_edge[line]]
+        pair_line[line] = emp
+        pair_emp[emp] = line
+    pair_line[stack[-1]] = found
+    pair_emp[found] = stack[-1]
+    return True
+
+
+@functools.lru_cache(maxsize=128)
+def _best_max_pairs(frozen_adj: Tuple[Tuple[int, ...], ...],
+                    num_emps: int,
+                    po_masks: Tuple[Tuple[int, int], ...]) -> Tuple[Tuple[Tuple[int, int], ...], int]:
+    """
+    Best maximum matching as (sorted (line_idx, emp_idx) pairs, qty) for the given
+    (eligible-line bitmask, quantity) pairs. Cached, so repeated requests skip the search.
+
+    Quantity only depends on which lines are staffed, so this searches line sets (include /
+    exclude per line), collecting the sets that reach the best quantity. The lexicographically
+    smallest matching is derived once at the end, over those sets only. Throughout the search,
+    (pair_line, pair_emp) is a maximum matching that staffs every included line using only
+    included and undecided lines.
+    """
+    adj, max_size = _max_matching_graph(frozen_adj, num_emps)
+    if max_size == 0:
+        return (), -1
+    num_lines = len(adj)
+    deadline = time.monotonic() + MAX_SEARCH_SECONDS
+    steps = 0
+
+    def out_of_budget() -> bool:
+        return steps >= MAX_SEARCH_STEPS or time.monotonic() > deadline
+
+    # Quantity upper bound: line_max_qty[l] is all quantity line l could cover on its own. Lines
+    # are decided by descending line_max_qty, so the k largest values among the undecided lines
+    # ordered_lines[i:] sum to prefix_qty[i + k] - prefix_qty[i] (overestimate)
+    line_max_qty = [sum(q for mask, q in po_masks if mask >> line & 1) for line in range(num_lines)]
+    ordered_lines = sorted(range(num_lines), key=lambda ln: -line_max_qty[ln])
+    prefix_qty = [0]
+    for line in ordered_lines:
+        prefix_qty.append(prefix_qty[-1] + line_max_qty[line])
+
+    # Warm start: greedily staff lines by descending line_max_qty with the first free employee,
+    # then complete that partial matching with augmenting paths. The result is a maximum
+    # matching, so it is a valid candidate and seeds best_qty for the bound above.
+    pair_emp = [-1] * num_emps
+    for line in ordered_lines:
+        for emp in adj[line]:
+            if pair_emp[emp] < 0:
+                pair_emp[emp] = line
+                break
+    _hopcroft_karp(adj, num_emps, pair_emp)
+    pair_line = [-1] * num_lines
+    for emp, line in enumerate(pair_emp):
+        if line >= 0:
+            pair_line[line] = emp
+    seed_mask = sum(1 << line for line in range(num_lines) if pair_line[line] >= 0)
+    best_qty = sum(q for mask, q in po_masks if mask & seed_mask)
+    # Staffed-lines mask and matching of each line set reaching best_qty. Only sets sharing the
+    # smallest lowest line can win the tie-break, so the others are not kept.
+    ties: List[Tuple[int, Tuple[int, ...]]] = [(seed_mask, tuple(pair_line))]
+
+    chosen_lines_mask = 0  # bit l set <=> line l is included (staffed)
+    undecided_mask = (1 << num_lines) - 1  # bit l set <=> line l is not decided yet
+    num_chosen = 0
+    cur_qty = 0  # quantity covered by the included lines
+    gain = [0] * num_lines  # quantity including ordered_lines[i] adds on top of the lines above it
+    saved: List[Optional[Tuple[List[int], List[int]]]] = []  # matching before each applied decision
+
+    def choices(i: int) -> List[bool]:
+        # Include the line first, then exclude it
+        line = ordered_lines[i]
+        gain[i] = sum(q for mask, q in po_masks if mask >> line & 1 and not mask & chosen_lines_mask)
+        return [True, False]
+
+    def enter(i: int, include: bool) -> int:
+        nonlocal pair_line, pair_emp, chosen_lines_mask, undecided_mask, num_chosen, cur_qty, best_qty, ties, steps
+        if out_of_budget():
+            return _STOP
+        steps += 1
         line = ordered_lines[i]
-        candidates = line_to_emps.get(line, [])
+        bit = 1 << line
+        before = None
+        if include:
+            if pair_line[line] < 0:
+                # Make room for the line by dropping an undecided line from the matching
+                before = (pair_line[:], pair_emp[:])
+                steps += 1
+                if not _alternate(adj, pair_line, pair_emp, [line], chosen_lines_mask, undecided_mask & ~bit):
+                    return _REJECT
+            chosen_lines_mask |= bit
+            num_chosen += 1
+            cur_qty += gain[i]
+        else:
+            emp = pair_line[line]
+            if emp >= 0:
+                # Hand the freed employee to an unmatched undecided line to keep the size
+                before = (pair_line[:], pair_emp[:])
+                pair_line[line] = -1
+                pair_emp[emp] = -1
+                steps += 1
+                if not _alternate(adj, pair_line, pair_emp,
+                                  [ln for ln in ordered_lines[i + 1:] if pair_line[ln] < 0],
+                                  (chosen_lines_mask | undecided_mask) & ~bit, 0):
+                    pair_line, pair_emp = before
+                    return _REJECT
+        undecided_mask &= ~bit
+        saved.append(before)
+
+        if num_chosen == max_size:
+            # Every other line stays idle: a complete candidate
+            if cur_qty > best_qty:
+                best_qty = cur_qty
+                ties = [(chosen_lines_mask, tuple(pair_line))]
+            elif cur_qty == best_qty:
+                low = chosen_lines_mask & -chosen_lines_mask
+                tie_low = ties[0][0] & -ties[0][0]
+                if low < tie_low:
+                    ties = [(chosen_lines_mask, tuple(pair_line))]
+                elif low == tie_low:
+                    ties.append((chosen_lines_mask, tuple(pair_line)))
+            return _PRUNE
+        # Strict: ties must still be explored for the lexicographic tie-break
+        if cur_qty + prefix_qty[i + 1 + max_size - num_chosen] - prefix_qty[i + 1] < best_qty:
+            return _PRUNE
+        return _DESCEND
+
+    def leave(i: int, include: bool) -> None:
+        nonlocal pair_line, pair_emp, chosen_lines_mask, undecided_mask, num_chosen, cur_qty
+        bit = 1 << ordered_lines[i]
+        before = saved.pop()
+        if before is not None:
+            pair_line, pair_emp = before
+        undecided_mask |= bit
+        if include:
+            chosen_lines_mask &= ~bit
+            num_chosen -= 1
+            cur_qty -= gain[i]
+
+    for _ in _backtrack(choices, enter, leave):
+        pass
+
+    def lexmin_pairs(lines_mask: int, matched: Tuple[int, ...],
+                     beat: Tuple[Tuple[int, int], ...]) -> Optional[Tuple[Tuple[int, int], ...]]:
+        # Lexicographically smallest matching staffing exactly the lines in lines_mask, starting from
+        # the matching matched: fix lines in ascending order, each with the smallest employee the
+        # unfixed lines can make room for. Gives up (None) as soon as the result cannot be smaller
+        # than beat, or the budget runs out.
+        nonlocal steps
+        pair_line = list(matched)
+        pair_emp = [-1] * num_emps
+        lines = [line for line in range(num_lines) if lines_mask >> line & 1]
+        for line in lines:
+            pair_emp[pair_line[line]] = line
+        unfixed = lines_mask
+        for pos, line in enumerate(lines):
+            unfixed &= ~(1 << line)
+            if beat:
+                # Positions differing in their line already decide the comparison
+                if line > beat[pos][0]:
+                    return None
+                if line < beat[pos][0]:
+                    beat = ()
+            old_emp = pair_line[line]
+            for emp in adj[line]:
+                if emp >= old_emp:
+                    break
+                owner = pair_emp[emp]
+                if owner >= 0 and not unfixed >> owner & 1:
+                    continue
+                pair_emp[old_emp] = -1
+                pair_line[line] = emp
+                pair_emp[emp] = line
+                if owner < 0:
+                    break
+                if out_of_budget():
+                    return None
+                steps += 1
+                pair_line[owner] = -1
+                if _alternate(adj, pair_line, pair_emp, [owner], unfixed & ~(1 << owner), 0):
+                    break
+                # No room: undo the swap
+                pair_line[owner] = emp
+                pair_emp[emp] = owner
+                pair_line[line] = old_emp
+                pair_emp[old_emp] = line
+            if beat:
+                if (line, pair_line[line]) > beat[pos]:
+                    return None
+                if (line, pair_line[line]) < beat[pos]:
+                    beat = ()
+        if beat:
+            return None  # equal to beat
+        return tuple((line, pair_line[line]) for line in lines)
+
+    # Tie-break: start from any collected matching (valid even if the budget has run out), then
+    # keep the smallest. Sets with a smaller line sequence go first, as they most likely win.
+    ties.sort(key=lambda tie: [line for line in range(num_lines) if tie[0] >> line & 1])
+    tie_mask, matched = ties[0]
+    best_pairs = tuple((line, matched[line]) for line in range(num_lines) if tie_mask >> line & 1)
+    for tie_mask, matched in ties:
+        pairs = lexmin_pairs(tie_mask, matched, best_pairs)
+        if pairs is not None:
+            best_pairs = pairs
+        elif out_of_budget():
+            break
+    return best_pairs, best_qty
+
+
+def best_max_assignment(lines_available: List[str],
+                        employees_available: List[Dict[str, Any]],
+                        production_orders: List[Dict[str, Any]],
+                        mat_to_lines: Dict[str, FrozenSet[str]]) -> Optional[Tuple[Tuple[Tuple[str, str], ...], int]]:
+    """
+    Returns (combo, qty) for the maximum-cardinality assignment maximizing theoretical producible
+    quantity (ties -> lexicographically smallest combo), or None if nobody can be assigned.
+    Scoring is fused into the search, so only the best combo is ever kept. On large inputs the
+    search stops after MAX_SEARCH_STEPS steps or MAX_SEARCH_SECONDS seconds and returns the best
+    combo found so far, which then need not be optimal nor the smallest among ties.
+    """
+    line_names, emp_names, frozen_adj = _intern_graph(lines_available, employees_available)
 
-        # Option: skip line (only if still possible to reach max_size)
-        backtrack(i + 1)
+    # Quantity per eligible-line bitmask (POs of the same material share one mask), largest first
+    mat_mask = _material_line_bits(mat_to_lines, {line: idx for idx, line in enumerate(line_names)})
+    qty_by_mask: Dict[int, int] = {}
+    for po in production_orders:
+        mask = mat_mask.get(po["material_number"], 0)
+        if mask:
+            qty_by_mask[mask] = qty_by_mask.get(mask, 0) + int(po["quantity"])
+    po_masks = tuple(sorted(qty_by_mask.items(), key=lambda mq: (-mq[1], mq[0])))
 
-        # Option: assign an eligible employee
-        for emp in candidates:
-            if emp in used_emps:
-                continue
-            used_emps.add(emp)
-            cur_pairs.append((line, emp))
-            backtrack(i + 1)
-            cur_pairs.pop()
-            used_emps.remove(emp)
+    best_pairs, best_qty = _best_max_pairs(frozen_adj, len(emp_names), po_masks)
+    if not best_pairs:
+        return None
+
+    # Map interned ids back to strings (int order == string order, so still sorted)
+    return tuple((line_names[line], emp_names[emp]) for (line, emp) in best_pairs), best_qty
 
-    backtrack(0)
 
+def employee_assignment(lines_available: List[str], employees_available: List[Dict[str, Any]]) -> List[List[Dict[str, str]]]:
+    line_names, emp_names, frozen_adj = _intern_graph(lines_available, employees_available)
+    adj, max_size = _max_matching_graph(frozen_adj, len(emp_names))
+    # Deterministic order: plain tuple sort on interned ints (int order == string order)
+    combos = sorted(_iter_max_pairs(adj, max_size, len(emp_names)))
     # Convert to required format
-    results = [[{line: emp} for (line, emp) in combo] for combo in results_set]
-    # Deterministic order
-    results.sort(key=lambda comb: [(list(d.keys())[0], list(d.values())[0]) for d in comb])
-    return results
+    return [[{line_names[line]: emp_names[emp]} for (line, emp) in combo] for combo in combos]
 
 
 # ---------- Quantity scoring for an assignment (by line availability only) ----------
+def _material_line_bits(mat_to_lines: Dict[str, FrozenSet[str]], line_id: Dict[str, int]) -> Dict[str, int]:
+    # Material -> bitmask of its allowed lines (bit line_id[line]); lines outside line_id are dropped
+    return {
+        mat: functools.reduce(operator.or_, (1 << line_id[line] for line in lines if line in line_id), 0)
+        for mat, lines in mat_to_lines.items()
+    }
+
+
 def score_assignment_quantity(lines_for_combo: List[str],
                               production_orders: List[Dict[str, Any]],
-                              materials: List[Dict[str, Any]]) -> int:
-    mat_to_lines: Dict[str, Set[str]] = {m["material_number"]: set(m.get("line", [])) for m in materials}
+                              mat_to_lines: Dict[str, FrozenSet[str]]) -> int:
     lines_set = set(lines_for_combo)
     total_qty = 0
     for po in production_orders:
-        allowed = mat_to_lines.get(po["material_number"], set())
+        allowed = mat_to_lines.get(po["material_number"], frozenset())
         if lines_set & allowed:
             total_qty += int(po["quantity"])
     return total_qty
 
 
 # ---------- Non-splittable greedy schedule (density + best-fit) w/ start times ----------
+@numba.njit(cache=True)
+def _schedule_core(durations, elig_offsets, elig_flat, time_used, shift_len, order_of_job):
+    """
+    Compiled best-fit loop. Jobs are visited in order_of_job; job j may run on lines
+    elig_flat[elig_offsets[j]:elig_offsets[j + 1]] (ascending). Each job goes to the eligible line
+    with MOST remaining capacity (ties -> largest idx) that fits it whole; time_used is updated
+    in place. Returns (assign_line, start_s) per job, assign_line == -1 if it fits nowhere.
+    """
+    n = durations.shape[0]
+    assign_line = np.full(n, -1, dtype=np.int64)
+    start_s = np.zeros(n, dtype=np.int64)
+    for k in range(order_of_job.shape[0]):
+        j = order_of_job[k]
+        dur = durations[j]
+        best = -1
+        best_rem = -1
+        for p in range(elig_offsets[j], elig_offsets[j + 1]):
+            ln = elig_flat[p]
+            rem = shift_len - time_used[ln]
+            if rem >= dur and rem >= best_rem:
+                best = ln
+                best_rem = rem
+        if best >= 0:
+            assign_line[j] = best
+            start_s[j] = time_used[best]
+            time_used[best] += dur
+    return assign_line, start_s
+
+
 def schedule_orders_greedy_nosplit(
     available_lines: List[str],
     production_orders: List[Dict[str, Any]],
-    materials: List[Dict[str, Any]],
+    mat_to_lines: Dict[str, FrozenSet[str]],
     shift_start: datetime,
     shift_length_seconds: int,
 ) -> Dict[str, List[Dict[str, str]]]:
@@ -112,10 +682,21 @@ def schedule_orders_greedy_nosplit(
     if shift_len <= 0 or not available_lines:
         return {ln: [] for ln in available_lines}
 
-    mat_to_lines = {m["material_number"]: set(m.get("line", [])) for m in materials}
+    # Lines indexed by name order (idx order == name order)
+    line_names = sorted(set(available_lines))
+    line_idx = {ln: i for i, ln in enumerate(line_names)}
+    per_line_sequence: Dict[str, List[Dict[str, str]]] = {ln: [] for ln in available_lines}
 
-    def eligible_lines_for_order(po) -> List[str]:
-        return sorted(set(available_lines) & mat_to_lines.get(po["material_number"], set()))
+    # Eligible line idx per material (ascending), computed once by walking the set bits low to high
+    mat_bits = _material_line_bits(mat_to_lines, line_idx)
+    mat_elig: Dict[str, List[int]] = {}
+    for mat in {po["material_number"] for po in production_orders}:
+        bits = mat_bits.get(mat, 0)
+        elig = []
+        while bits:
+            elig.append((bits & -bits).bit_length() - 1)
+            bits &= bits - 1
+        mat_elig[mat] = elig
 
     # Enrich + filter by eligibility
     enriched = []
@@ -123,38 +704,45 @@ def schedule_orders_greedy_nosplit(
         q = int(po["quantity"])
         tpu = float(po["time_to_complete"])
         dur = int(q * tpu)
-        elig = eligible_lines_for_order(po)
+        elig = mat_elig[po["material_number"]]
         if not elig:
             continue
         enriched.append({
             **po,
             "duration_s": dur,
-            "eligible_lines": elig,
+            "eligible_lines_idx": elig,
             "density": (1.0 / tpu) if tpu > 0 else float("inf"),
         })
+    if not enriched:
+        return per_line_sequence
 
     # Sort: higher density first, then shorter duration, then order_number
-    enriched.sort(key=lambda x: (-x["density"], x["duration_s"], x["order_number"]))
-
-    # Line state
-    line_time_used = {ln: 0 for ln in available_lines}
-    per_line_sequence: Dict[str, List[Dict[str, str]]] = {ln: [] for ln in available_lines}
+    order_of_job = np.array(
+        sorted(range(len(enriched)),
+               key=lambda j: (-enriched[j]["density"], enriched[j]["duration_s"], enriched[j]["order_number"])),
+        dtype=np.int64,
+    )
 
-    for job in enriched:
-        dur = job["duration_s"]
-        # lines that can fit the whole job
-        candidates = [ln for ln in job["eligible_lines"] if line_time_used[ln] + dur <= shift_len]
-        if not candidates:
-            continue
-        # Choose line with MOST remaining capacity
-        best_line = max(candidates, key=lambda ln: (shift_len - line_time_used[ln], -line_time_used[ln], ln))
-        # Start time = shift_start + used_time on that line
-        start_dt = shift_start + timedelta(seconds=line_time_used[best_line])
-        per_line_sequence[best_line].append({
-            "order_number": job["order_number"],
-            "start": start_dt.isoformat()
+    # Numeric job data; eligible lines as CSR (offsets, flat)
+    durations = np.array([job["duration_s"] for job in enriched], dtype=np.int64)
+    elig_offsets = np.zeros(len(enriched) + 1, dtype=np.int64)
+    np.cumsum([len(job["eligible_lines_idx"]) for job in enriched], out=elig_offsets[1:])
+    elig_flat = np.array([ln for job in enriched for ln in job["eligible_lines_idx"]], dtype=np.int64)
+    time_used = np.zeros(len(line_names), dtype=np.int64)
+
+    assign_line, start_s = _schedule_core(durations, elig_offsets, elig_flat, time_used, shift_len, order_of_job)
+
+    # Back to the object domain only at the end: plain ints, then one ISO conversion pass
+    assign_line = assign_line.tolist()
+    start_s = start_s.tolist()
+    scheduled = [j for j in order_of_job.tolist() if assign_line[j] >= 0]
+    # Start time = shift_start + used_time on that line
+    starts = [(shift_start + timedelta(seconds=start_s[j])).isoformat() for j in scheduled]
+    for j, start in zip(scheduled, starts):
+        per_line_sequence[line_names[assign_line[j]]].append({
+            "order_number": enriched[j]["order_number"],
+            "start": start
         })
-        line_time_used[best_line] += dur
 
     return per_line_sequence
 
@@ -173,7 +761,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     }
     """
     try:
-        body = req.get_json()
+        body = orjson.loads(req.get_body())
     except Exception:
         return func.HttpResponse("Invalid or missing JSON body.", status_code=400)
 
@@ -187,43 +775,39 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     # Parse shift_start
     try:
         if shift_start_raw:
-            # Allow 'Z'
-            shift_start = datetime.fromisoformat(shift_start_raw.replace("Z", "+00:00"))
+            # Allow 'Z' (strip it instead of rewriting the string to '+00:00')
+            if shift_start_raw.endswith("Z"):
+                shift_start = datetime.fromisoformat(shift_start_raw[:-1])
+                if shift_start.tzinfo is not None:
+                    # An explicit offset followed by 'Z' is ambiguous
+                    raise ValueError("shift_start has both an offset and 'Z'")
+                shift_start = shift_start.replace(tzinfo=timezone.utc)
+            else:
+                shift_start = datetime.fromisoformat(shift_start_raw)
         else:
             shift_start = datetime.utcnow()
     except Exception:
         return func.HttpResponse("Invalid 'shift_start' format. Use ISO 8601.", status_code=400)
 
-    # 1) All maximum-cardinality assignments
-    assignments = employee_assignment(lines_available, employees_available)
+    # Material -> allowed lines, built once and shared by scoring and scheduling
+    mat_to_lines = {m["material_number"]: frozenset(m.get("line", [])) for m in materials}
+
+    # 1) + 2) Maximum-cardinality assignment maximizing theoretical producible quantity
+    best = best_max_assignment(lines_available, employees_available, production_orders, mat_to_lines)
 
-    if not assignments:
+    if best is None:
         resp = {"shift_start": shift_start.isoformat(), "lines": [], "assignment": {}, "sequence": {}}
-        return func.HttpResponse(json.dumps(resp), status_code=200, mimetype="application/json")
-
-    # Helper to extract lines from combo
-    def lines_from_combo(combo: List[Dict[str, str]]) -> List[str]:
-        return [next(iter(d.keys())) for d in combo]
-
-    # 2) Pick assignment maximizing theoretical producible quantity
-    best_idx = 0
-    best_qty = -1
-    for i, combo in enumerate(assignments):
-        lines_combo = lines_from_combo(combo)
-        qty = score_assignment_quantity(lines_combo, production_orders, materials)
-        if qty > best_qty:
-            best_qty = qty
-            best_idx = i
-
-    chosen = assignments[best_idx]
-    chosen_lines = lines_from_combo(chosen)
-    assignment_map = {list(d.keys())[0]: list(d.values())[0] for d in chosen}
+        return func.HttpResponse(body=orjson.dumps(resp, option=orjson.OPT_NON_STR_KEYS), status_code=200, mimetype="application/json")
+
+    best_combo, _ = best
+    chosen_lines = [line for (line, _) in best_combo]
+    assignment_map = dict(best_combo)
 
     # 3) Build non-splittable greedy schedule sequence per line (with order start times)
     sequence = schedule_orders_greedy_nosplit(
         available_lines=chosen_lines,
         production_orders=production_orders,
-        materials=materials,
+        mat_to_lines=mat_to_lines,
         shift_start=shift_start,
         shift_length_seconds=shift_length_seconds,
     )
@@ -235,4 +819,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         "assignment": assignment_map,
         "sequence": sequence
     }
-    return func.HttpResponse(json.dumps(resp), status_code=200, mimetype="application/json")
+    return func.HttpResponse(body=orjson.dumps(resp, option=orjson.OPT_NON_STR_KEYS), status_code=200, mimetype="application/json")
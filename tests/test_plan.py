@@ -0,0 +1,212 @@
+import json
+import random
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import azure.functions as func
+
+import plan
+
+
+# ---------- Reference: the original brute-force implementation ----------
+def reference_employee_assignment(lines_available: List[str],
+                                  employees_available: List[Dict[str, Any]]) -> List[List[Dict[str, str]]]:
+    line_to_emps = {
+        line: [emp["id"] for emp in employees_available if line in emp.get("qualifiedLines", [])]
+        for line in lines_available
+    }
+    match_emp_to_line: Dict[str, str] = {}
+
+    def try_augment(line, seen):
+        for emp in line_to_emps.get(line, []):
+            if emp in seen:
+                continue
+            seen.add(emp)
+            if emp not in match_emp_to_line or try_augment(match_emp_to_line[emp], seen):
+                match_emp_to_line[emp] = line
+                return True
+        return False
+
+    for line in lines_available:
+        try_augment(line, set())
+    max_size = len(match_emp_to_line)
+    if max_size == 0:
+        return []
+
+    results = set()
+    used, cur = set(), []
+
+    def backtrack(i):
+        if i == len(lines_available):
+            if len(cur) == max_size:
+                results.add(tuple(sorted(cur)))
+            return
+        line = lines_available[i]
+        backtrack(i + 1)
+        for emp in line_to_emps[line]:
+            if emp not in used:
+                used.add(emp)
+                cur.append((line, emp))
+                backtrack(i + 1)
+                cur.pop()
+                used.remove(emp)
+
+    backtrack(0)
+    return [[{line: emp} for (line, emp) in combo] for combo in sorted(results)]
+
+
+def reference_plan(body: Dict[str, Any]) -> Dict[str, Any]:
+    shift_start = datetime.fromisoformat(body["shift_start"].replace("Z", "+00:00"))
+    mat_to_lines = {m["material_number"]: set(m.get("line", [])) for m in body["materials"]}
+    assignments = reference_employee_assignment(body["lines_available"], body["employees_available"])
+    if not assignments:
+        return {"shift_start": shift_start.isoformat(), "lines": [], "assignment": {}, "sequence": {}}
+
+    def qty(combo):
+        lines = {next(iter(d)) for d in combo}
+        return sum(int(po["quantity"]) for po in body["production_orders"]
+                   if lines & mat_to_lines.get(po["material_number"], set()))
+
+    chosen = max(assignments, key=qty)  # first maximum == lexicographically smallest combo
+    chosen_lines = [next(iter(d)) for d in chosen]
+
+    shift_len = int(body["shift_length_seconds"])
+    sequence = {ln: [] for ln in chosen_lines}
+    if shift_len > 0:
+        jobs = []
+        for po in body["production_orders"]:
+            tpu = float(po["time_to_complete"])
+            elig = sorted(set(chosen_lines) & mat_to_lines.get(po["material_number"], set()))
+            if elig:
+                jobs.append((-(1.0 / tpu if tpu > 0 else float("inf")), int(int(po["quantity"]) * tpu),
+                             po["order_number"], elig))
+        jobs.sort(key=lambda j: j[:3])
+        used = {ln: 0 for ln in chosen_lines}
+        for _, dur, order_number, elig in jobs:
+            fits = [ln for ln in elig if used[ln] + dur <= shift_len]
+            if fits:
+                ln = max(fits, key=lambda x: (shift_len - used[x], x))
+                sequence[ln].append({"order_number": order_number,
+                                     "start": (shift_start + timedelta(seconds=used[ln])).isoformat()})
+                used[ln] += dur
+    return {
+        "shift_start": shift_start.isoformat(),
+        "lines": sorted(chosen_lines),
+        "assignment": {next(iter(d)): next(iter(d.values())) for d in chosen},
+        "sequence": sequence,
+    }
+
+
+def random_body(rng: random.Random) -> Dict[str, Any]:
+    lines = list(dict.fromkeys(f"L{rng.randint(1, 30):02d}" for _ in range(rng.randint(0, 7))))
+    employees = [
+        {"id": f"E{i}", "qualifiedLines": rng.sample(lines, rng.randint(0, len(lines)))}
+        for i in rng.sample(range(50), rng.randint(0, 8))
+    ]
+    materials = [
+        {"material_number": f"M{i}", "line": rng.sample(lines + ["LX"], rng.randint(0, min(3, len(lines) + 1)))}
+        for i in range(rng.randint(0, 5))
+    ]
+    orders = [
+        {"order_number": f"PO-{i:03d}", "material_number": f"M{rng.randint(0, 5)}",
+         "quantity": rng.randint(1, 100), "time_to_complete": rng.choice([0, 10, 30.5, 60, 120])}
+        for i in range(rng.randint(0, 12))
+    ]
+    return {
+        "lines_available": lines,
+        "employees_available": employees,
+        "production_orders": orders,
+        "materials": materials,
+        "shift_start": rng.choice(["2025-08-13T06:00:00Z", "2025-08-13T06:00:00+02:00", "2025-08-13T06:00:00"]),
+        "shift_length_seconds": rng.choice([0, 3600, 28800]),
+    }
+
+
+def call_main(body: Dict[str, Any]) -> func.HttpResponse:
+    req = func.HttpRequest(method="POST", url="/api/plan", body=json.dumps(body).encode())
+    return plan.main(req)
+
+
+class EmployeeAssignmentTest(unittest.TestCase):
+    def test_matches_reference_on_random_graphs(self):
+        for seed in range(300):
+            body = random_body(random.Random(seed))
+            with self.subTest(seed=seed):
+                self.assertEqual(
+                    plan.employee_assignment(body["lines_available"], body["employees_available"]),
+                    reference_employee_assignment(body["lines_available"], body["employees_available"]),
+                )
+
+    def test_iter_max_assignments_yields_each_combo_once(self):
+        for seed in range(100):
+            body = random_body(random.Random(seed))
+            combos = list(plan.iter_max_assignments(body["lines_available"], body["employees_available"]))
+            with self.subTest(seed=seed):
+                self.assertEqual(len(combos), len(set(combos)))
+                self.assertEqual(
+                    [[{line: emp} for (line, emp) in combo] for combo in sorted(combos)],
+                    plan.employee_assignment(body["lines_available"], body["employees_available"]),
+                )
+
+
+class BestMaxAssignmentTest(unittest.TestCase):
+    def test_truncated_search_returns_a_maximum_assignment(self):
+        for seed in range(40):
+            body = random_body(random.Random(seed))
+            mat_to_lines = {m["material_number"]: frozenset(m.get("line", [])) for m in body["materials"]}
+            reference = reference_employee_assignment(body["lines_available"], body["employees_available"])
+            for budget in range(0, 51, 5):
+                plan._best_max_pairs.cache_clear()
+                with self.subTest(seed=seed, budget=budget), mock.patch.object(plan, "MAX_SEARCH_STEPS", budget):
+                    best = plan.best_max_assignment(body["lines_available"], body["employees_available"],
+                                                    body["production_orders"], mat_to_lines)
+                    if not reference:
+                        self.assertIsNone(best)
+                        continue
+                    combo, qty = best
+                    self.assertIn([{line: emp} for (line, emp) in combo], reference)
+                    self.assertEqual(qty, plan.score_assignment_quantity(
+                        [line for (line, _) in combo], body["production_orders"], mat_to_lines))
+        plan._best_max_pairs.cache_clear()
+
+
+class MainTest(unittest.TestCase):
+    def test_matches_reference_on_random_requests(self):
+        for seed in range(300):
+            body = random_body(random.Random(seed))
+            with self.subTest(seed=seed):
+                resp = call_main(body)
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(json.loads(resp.get_body()), reference_plan(body))
+
+    def test_numeric_line_ids(self):
+        body = {
+            "lines_available": [1, 2, 3],
+            "employees_available": [{"id": "E1", "qualifiedLines": [1, 2]}, {"id": "E2", "qualifiedLines": [2]}],
+            "production_orders": [{"order_number": "PO-001", "material_number": "M1", "quantity": 10,
+                                   "time_to_complete": 60}],
+            "materials": [{"material_number": "M1", "line": [1, 3]}],
+            "shift_start": "2025-08-13T06:00:00Z",
+            "shift_length_seconds": 28800,
+        }
+        resp = call_main(body)
+        self.assertEqual(resp.status_code, 200)
+        # Line ids become string keys, as json.dumps does
+        self.assertEqual(json.loads(resp.get_body()), json.loads(json.dumps(reference_plan(body))))
+
+    def test_shift_start_z_suffix(self):
+        body = random_body(random.Random(0))
+        body["shift_start"] = "2025-08-13T06:00:00Z"
+        self.assertEqual(json.loads(call_main(body).get_body())["shift_start"], "2025-08-13T06:00:00+00:00")
+        body["shift_start"] = "2025-08-13T06:00:00+02:00Z"
+        self.assertEqual(call_main(body).status_code, 400)
+
+    def test_invalid_json_body(self):
+        req = func.HttpRequest(method="POST", url="/api/plan", body=b"{not json")
+        self.assertEqual(plan.main(req).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()